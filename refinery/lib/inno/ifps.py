@@ -7,9 +7,12 @@ The code is based on the logic implemented in IFPSTools:
 from __future__ import annotations
 
 import abc
+import codecs
 import enum
 import io
 import itertools
+import math
+import struct
 
 from typing import (
     Callable,
@@ -18,6 +21,7 @@ from typing import (
     List,
     NamedTuple,
     Optional,
+    Set,
     Tuple,
     Type,
     TypeVar,
@@ -26,12 +30,10 @@ from typing import (
 
 from uuid import UUID
 from dataclasses import dataclass, field
-from collections import OrderedDict
-from functools import WRAPPER_ASSIGNMENTS, update_wrapper
 
 from refinery.lib.structures import Struct, StructReader
 from refinery.lib.inno.symbols import IFPSAPI, IFPSClasses, IFPSEvents
-from refinery.lib.types import CaseInsensitiveDict
+from refinery.lib.types import ByteStr, CaseInsensitiveDict
 
 _E = TypeVar('_E', bound=Type[enum.Enum])
 _C = TypeVar('_C', bound=Type)
@@ -39,33 +41,36 @@ _C = TypeVar('_C', bound=Type)
 _TAB = '\x20\x20'
 
 
+_Extended = struct.Struct('<QH')
+
+
 def extended(_data: bytes):
     if len(_data) != 10:
         raise ValueError
-    data = int.from_bytes(_data, 'little')
-    sign = data >> 79
-    data = data ^ (sign << 79)
-    sign = -1.0 if sign else +1.0
-    exponent = data >> 64
-    data = data ^ (exponent << 64)
+    mantissa, exponent = _Extended.unpack(_data)
+    sign = -1.0 if exponent & 0x8000 else +1.0
+    exponent &= 0x7FFF
     if exponent == 0:
-        if data == 0:
+        if mantissa == 0:
             return sign * 0
-        exponent = -16382
-    elif exponent == 0b111111111111111:
-        if data == 0:
+        exponent = 1
+    elif exponent == 0x7FFF:
+        if mantissa & 0x7FFFFFFFFFFFFFFF == 0:
             return sign * float('Inf')
         else:
             return sign * float('NaN')
-    else:
-        exponent = exponent - 16383
-    mantissa = data / (1 << 64)
-    return sign * mantissa * (2 ** exponent)
+    try:
+        return sign * math.ldexp(mantissa, exponent - 16383 - 63)
+    except OverflowError:
+        return sign * float('Inf')
 
 
 def represent(cls: _E) -> _E:
-    cls.__repr__ = lambda self: F'{self.__class__.__name__}.{self.name}'
-    cls. __str__ = lambda self: self.name
+    for member in cls:
+        member._str = member.name
+        member._repr = F'{cls.__name__}.{member.name}'
+    cls.__repr__ = lambda self: self._repr
+    cls. __str__ = lambda self: self._str
     return cls
 
 
@@ -103,12 +108,22 @@ class Op(enum.IntEnum):
 
     @classmethod
     def FromInt(cls, code: int):
-        try:
-            return cls(code)
-        except ValueError:
-            return cls._INVALID
+        return _Op_ByInt.get(code, cls._INVALID)
+
+
+_Op_ByInt: Dict[int, Op] = {op.value: op for op in Op}
+
+
+def glyphs(*symbols: str) -> Callable[[_E], _E]:
+    def decorator(cls: _E) -> _E:
+        for member, symbol in zip(cls, symbols):
+            member._str = symbol
+        cls.__str__ = lambda self: self._str
+        return cls
+    return decorator
 
 
+@glyphs('+=', '-=', '*=', '/=', '%=', '<<=', '>>=', '&=', '|=', '^=')
 class AOp(enum.IntEnum):
     Add = 0
     Sub = 1
@@ -121,11 +136,8 @@ class AOp(enum.IntEnum):
     BOr = 8
     Xor = 9
 
-    def __str__(self):
-        glyph = ('+', '-', '*', '/', '%', '<<', '>>', '&', '|', '^')[self]
-        return F'{glyph}='
-
 
+@glyphs('>=', '<=', '>', '<', '!=', '==', 'in', 'is')
 class COp(enum.IntEnum):
     GE = 0
     LE = 1
@@ -136,9 +148,6 @@ class COp(enum.IntEnum):
     IN = 6
     IS = 7
 
-    def __str__(self):
-        return ('>=', '<=', '>', '<', '!=', '==', 'in', 'is')[self]
-
 
 @represent
 class TC(enum.IntEnum):
@@ -177,42 +186,57 @@ class TC(enum.IntEnum):
 
     @property
     def width(self):
-        return {
-            TC.Variant       : 0x10,
-            TC.Char          : 0x01,
-            TC.S08           : 0x01,
-            TC.U08           : 0x01,
-            TC.WideChar      : 0x02,
-            TC.S16           : 0x02,
-            TC.U16           : 0x02,
-            TC.WideString    : 0x04,
-            TC.UnicodeString : 0x04,
-            TC.Interface     : 0x04,
-            TC.Class         : 0x04,
-            TC.PChar         : 0x04,
-            TC.AnsiString    : 0x04,
-            TC.Single        : 0x04,
-            TC.S32           : 0x04,
-            TC.U32           : 0x04,
-            TC.ProcPtr       : 0x0C,
-            TC.Currency      : 0x08,
-            TC.Pointer       : 0x0C,
-            TC.Double        : 0x08,
-            TC.S64           : 0x08,
-            TC.Extended      : 0x0A,
-            TC.ReturnAddress : 0x1C,
-        }.get(self, 0)
-
-
-@dataclass
-class IFPSTypeMixin:
-    symbol: Optional[str] = None
-    attributes: Optional[List[Attribute]] = None
+        return _TC_Width.get(self, 0)
+
+
+_TC_Width: Dict[TC, int] = {
+    TC.Variant       : 0x10,
+    TC.Char          : 0x01,
+    TC.S08           : 0x01,
+    TC.U08           : 0x01,
+    TC.WideChar      : 0x02,
+    TC.S16           : 0x02,
+    TC.U16           : 0x02,
+    TC.WideString    : 0x04,
+    TC.UnicodeString : 0x04,
+    TC.Interface     : 0x04,
+    TC.Class         : 0x04,
+    TC.PChar         : 0x04,
+    TC.AnsiString    : 0x04,
+    TC.Single        : 0x04,
+    TC.S32           : 0x04,
+    TC.U32           : 0x04,
+    TC.ProcPtr       : 0x0C,
+    TC.Currency      : 0x08,
+    TC.Pointer       : 0x0C,
+    TC.Double        : 0x08,
+    TC.S64           : 0x08,
+    TC.Extended      : 0x0A,
+    TC.ReturnAddress : 0x1C,
+}
 
-    def __str__(self):
-        if self.symbol is not None:
-            return self.symbol
-        return super().__str__()
+_TC_Containers = frozenset((
+    TC.StaticArray,
+    TC.Array,
+    TC.Record,
+))
+_TC_Composites = _TC_Containers | frozenset((
+    TC.Class,
+    TC.ProcPtr,
+    TC.Interface,
+    TC.Set,
+))
+
+_TC_ReaderMethod: List[Optional[str]] = [None] * 0x100
+_TC_ReaderMethod[TC.U08]    = 'u8'   # noqa
+_TC_ReaderMethod[TC.S08]    = 'i8'   # noqa
+_TC_ReaderMethod[TC.U16]    = 'u16'  # noqa
+_TC_ReaderMethod[TC.S16]    = 'i16'  # noqa
+_TC_ReaderMethod[TC.U32]    = 'u32'  # noqa
+_TC_ReaderMethod[TC.S32]    = 'i32'  # noqa
+_TC_ReaderMethod[TC.S64]    = 'i64'  # noqa
+_TC_ReaderMethod[TC.Single] = 'f32'  # noqa
+_TC_ReaderMethod[TC.Double] = 'f64'  # noqa
 
 
 @dataclass
@@ -223,14 +247,10 @@ class IFPSTypeBase(abc.ABC):
         return True
 
     def indexed(self):
-        return self.code in (
-            TC.StaticArray,
-            TC.Array,
-            TC.Record,
-        )
+        return self.code in _TC_Containers
 
     def display(self, indent=0):
-        return indent * _TAB + self.code.name
+        return indent * _TAB + self.code._name_
 
     @abc.abstractmethod
     def py_type(self, key: Optional[int] = None) -> Optional[type]:
@@ -242,70 +262,34 @@ class IFPSTypeBase(abc.ABC):
 
     @property
     def primitive(self) -> bool:
-        return self.code not in {
-            TC.Class,
-            TC.ProcPtr,
-            TC.Interface,
-            TC.Set,
-            TC.StaticArray,
-            TC.Array,
-            TC.Record,
-        }
+        return self.code not in _TC_Composites
 
     @property
     def container(self) -> bool:
-        return self.code in {
-            TC.StaticArray,
-            TC.Array,
-            TC.Record,
-        }
+        return self.code in _TC_Containers
 
     def __str__(self):
+        if self.symbol is not None:
+            return self.symbol
         return self.display(0)
 
 
-def ifpstype(cls: _C) -> Union[_C, Type[IFPSTypeMixin]]:
-    cls = dataclass(cls)
-    mix = type(cls.__qualname__, (IFPSTypeMixin, cls), {})
-    assigned = set(WRAPPER_ASSIGNMENTS) - {'__annotations__'}
-    update_wrapper(mix, cls, assigned=assigned, updated=())
-    return dataclass(mix)
+def ifpstype(cls: _C) -> _C:
+    annotations = cls.__dict__.get('__annotations__', {})
+    cls.__annotations__ = {**annotations, 'symbol': 'Optional[str]', 'attributes': 'Optional[List[Attribute]]'}
+    cls.symbol = None
+    cls.attributes = None
+    return dataclass(cls)
 
 
 @ifpstype
 class TPrimitive(IFPSTypeBase):
 
     def py_type(self, *_) -> Optional[type]:
-        return {
-            TC.ReturnAddress       : int,
-            TC.U08                 : int,
-            TC.S08                 : int,
-            TC.U16                 : int,
-            TC.S16                 : int,
-            TC.U32                 : int,
-            TC.S32                 : int,
-            TC.Single              : float,
-            TC.Double              : float,
-            TC.Extended            : float,
-            TC.AnsiString          : str,
-            TC.Pointer             : VariableBase,
-            TC.PChar               : str,
-            TC.ResourcePointer     : VariableBase,
-            TC.Variant             : VariableBase,
-            TC.S64                 : int,
-            TC.Char                : str,
-            TC.WideString          : str,
-            TC.WideChar            : str,
-            TC.Currency            : float,
-            TC.UnicodeString       : str,
-            TC.Enum                : int,
-            TC.Type                : IFPSType,
-        }.get(self.code)
+        return _TC_PyType[self.code]
 
     def default(self, *_):
-        tc = self.py_type()
-        if issubclass(tc, (int, float, str)):
-            return tc()
+        return _TC_Default[self.code]
 
 
 @ifpstype
@@ -371,8 +355,7 @@ class TSet(IFPSTypeBase):
 
     @property
     def size_in_bytes(self):
-        q, r = divmod(self.size, 8)
-        return q + (r and 1 or 0)
+        return (self.size + 7) >> 3
 
     def display(self, indent=0):
         display = super().display(indent)
@@ -494,7 +477,7 @@ class Value(NamedTuple):
         value = self.value
         if isinstance(value, bytes):
             value = value.hex()
-        return F'{self.type.code.name}({value!r})'
+        return F'{self.type.code._name_}({value!r})'
 
     def __str__(self):
         v = self.value
@@ -649,28 +632,20 @@ class DeclSpec:
         return cls(void, parameters, name=name, **properties)
 
     @classmethod
-    def ParseE(cls, data: bytes, ipfs: IFPSFile):
-        decl = data.split(B'\x20')
-        try:
-            return_type = int(decl.pop(0))
-        except Exception:
-            void = True
-        else:
-            void = return_type < 0
-        if not void:
-            return_type = ipfs.types[return_type]
-        else:
+    def ParseE(cls, data: ByteStr, ipfs: IFPSFile):
+        types = ipfs.types
+        decl = codecs.decode(data, 'latin1').split('\x20')
+        return_type = decl.pop(0)
+        if void := not return_type.isdecimal():
             return_type = None
+        else:
+            return_type = types[int(return_type)]
         parameters = []
         for param in decl:
-            try:
-                i = int(param[1:])
-            except Exception:
-                tv = None
-            else:
-                tv = ipfs.types[i]
+            index = param[1:]
+            tv = types[int(index)] if index.isdecimal() else None
             parameters.append(
-                DeclSpecParam(param[:1] == B'@', tv))
+                DeclSpecParam(param[:1] == '@', tv))
         return cls(void, parameters, return_type=return_type)
 
 
@@ -682,6 +657,8 @@ class Function:
     attributes: Optional[List[Attribute]] = None
     _bbs: Optional[Dict[int, BasicBlock]] = None
     _ins: Optional[Dict[int, Instruction]] = None
+    max_stack: int = field(default=0, init=False, repr=False, compare=False)
+    labels: Optional[List[int]] = field(default=None, init=False, repr=False, compare=False)
 
     @property
     def name(self):
@@ -721,27 +698,29 @@ class Function:
             return bbs
         if self.body is None:
             bbs = self._bbs = {}
+            self.labels = []
             return bbs
 
         bbs: Dict[int, BasicBlock] = {0: (bb := BasicBlock(0))}
         self._bbs = bbs
 
         for insn in self.body:
+            offset = insn.offset
+            opcode = insn.opcode
             try:
-                bb = bbs[insn.offset]
+                bb = bbs[offset]
             except KeyError:
                 if insn.jumptarget:
-                    nb = bbs[insn.offset] = BasicBlock(insn.offset)
+                    nb = bbs[offset] = BasicBlock(offset)
                     nb.sources[bb.offset] = bb
-                    bb.targets[nb.offset] = nb
+                    bb.targets[offset] = nb
                     bb = nb
             bb.body.append(insn)
-            if not insn.branches:
+            if opcode not in _Op_Branches:
                 continue
             targets = [insn.operands[0]]
-            sequence = insn.offset + insn.size
-            if not insn.jumps and insn.opcode != Op.Ret:
-                targets.append(sequence)
+            if opcode not in _Op_Jumps:
+                targets.append(offset + insn.size)
             for t in targets:
                 if not (bt := bbs.get(t)):
                     bt = bbs[t] = BasicBlock(t)
@@ -758,31 +737,39 @@ class Function:
         visited: set[int] = set()
         errored: set[int] = set()
 
-        def trace_stack(offset: int, stack: Optional[int]):
+        trace: List[Tuple[int, Optional[int]]] = [(0, 0)]
+
+        while trace:
+            offset, stack = trace.pop()
             if offset in errored:
-                return
+                continue
             bb = bbs[offset]
             if bb.stack is not None and stack != bb.stack:
                 stack = None
             if stack is None:
                 errored.add(offset)
             elif offset in visited:
-                return
+                continue
             else:
                 visited.add(offset)
             bb.stack = stack
-            body = [] if stack is None else bb.body
-            for insn in body:
-                insn.stack = stack
-                stack += insn.stack_delta
-            for t in bb.targets:
-                trace_stack(t, stack)
+            if stack is not None:
+                for insn in bb.body:
+                    insn.stack = stack
+                    stack += insn.stack_delta
+                bb._stack_delta = stack - bb.stack
+            trace.extend((t, stack) for t in reversed(bb.targets))
 
-        trace_stack(0, 0)
+        max_stack = 0
+        self.labels = labels = []
 
         for insn in self.body:
+            if insn.jumptarget:
+                labels.append(insn.offset)
             if (stack := insn.stack) is None:
                 continue
+            if stack > max_stack:
+                max_stack = stack
             for k, op in enumerate(insn.operands):
                 if not isinstance(op, Operand):
                     continue
@@ -794,6 +781,7 @@ class Function:
                     F'Instruction {op!s} at offset 0x{insn.offset:X} in function {self.name} has '
                     F'variant operand {k} whose index {v.index} exceeds the stack depth {stack}.')
 
+        self.max_stack = max_stack
         return bbs
 
 
@@ -809,6 +797,41 @@ class VariableBase:
         return F'{self.spec}: {self.type!s}'
 
 
+_TC_PyType: List[Optional[type]] = [None] * 0x100
+_TC_Default: List[Union[int, float, str, None]] = [None] * 0x100
+
+for _code, _type in {
+    TC.ReturnAddress       : int,
+    TC.U08                 : int,
+    TC.S08                 : int,
+    TC.U16                 : int,
+    TC.S16                 : int,
+    TC.U32                 : int,
+    TC.S32                 : int,
+    TC.Single              : float,
+    TC.Double              : float,
+    TC.Extended            : float,
+    TC.AnsiString          : str,
+    TC.Pointer             : VariableBase,
+    TC.PChar               : str,
+    TC.ResourcePointer     : VariableBase,
+    TC.Variant             : VariableBase,
+    TC.S64                 : int,
+    TC.Char                : str,
+    TC.WideString          : str,
+    TC.WideChar            : str,
+    TC.Currency            : float,
+    TC.UnicodeString       : str,
+    TC.Enum                : int,
+    TC.Type                : IFPSType,
+}.items():
+    _TC_PyType[_code] = _type
+    if _type in (int, float, str):
+        _TC_Default[_code] = _type()
+
+del _code, _type
+
+
 @represent
 class OperandType(enum.IntEnum):
     Variant = 0
@@ -868,37 +891,76 @@ class Operand(NamedTuple):
         return self.__tostring(str)
 
     def __tostring(self, converter):
-        if self.type is OperandType.Value:
-            return converter(self.value)
-        if self.type is OperandType.Variant:
-            return converter(self.variant)
-        if self.type is OperandType.IndexedByInt:
-            return F'{converter(self.variant)}[0x{self.index:02X}]'
-        if self.type is OperandType.IndexedByVar:
-            return F'{converter(self.variant)}[{self.index!s}]'
-        raise RuntimeError(F'Unexpected OperandType {self.type!r} in {self.__class__.__name__}')
+        return _Operand_ToString[self.type](self, converter)
+
+
+_Operand_ToString: List[Callable[[Operand, Callable[[object], str]], str]] = [None] * len(OperandType)
+_Operand_ToString[OperandType.Variant] = lambda op, c: c(op.variant)
+_Operand_ToString[OperandType.Value] = lambda op, c: c(op.value)
+_Operand_ToString[OperandType.IndexedByInt] = lambda op, c: F'{c(op.variant)}[0x{op.index:02X}]'
+_Operand_ToString[OperandType.IndexedByVar] = lambda op, c: F'{c(op.variant)}[{op.index!s}]'
 
 
 _Op_Maxlen = max(len(op.name) for op in Op)
-_Op_StackD = {
-    Op.Push     : +1,
-    Op.PushVar  : +1,
-    Op.PushType : +1,
-    Op.Pop      : -1,
-    Op.JumpPop1 : -1,
-    Op.JumpPop2 : -2,
-}
+_Op_Pretty = F'{{!s:<{_Op_Maxlen}}}{_TAB}{{}}'.format
+_Op_StackD = [0] * 0x100
+_Op_StackD[Op.Push]     = +1  # noqa
+_Op_StackD[Op.PushVar]  = +1  # noqa
+_Op_StackD[Op.PushType] = +1  # noqa
+_Op_StackD[Op.Pop]      = -1  # noqa
+_Op_StackD[Op.JumpPop1] = -1  # noqa
+_Op_StackD[Op.JumpPop2] = -2  # noqa
+
+_Op_Jumps = frozenset((
+    Op.Jump,
+    Op.JumpPop1,
+    Op.JumpPop2,
+))
+_Op_Branches = _Op_Jumps | frozenset((
+    Op.JumpFalse,
+    Op.JumpTrue,
+    Op.JumpFlag,
+))
+
+
+InstructionArgument = Union[str, bool, int, float, Operand, IFPSType, Function, None]
 
 
-@dataclass
 class Instruction:
+    __slots__ = (
+        'offset',
+        'opcode',
+        'size',
+        'stack',
+        'operands',
+        'operator',
+        'jumptarget',
+    )
     offset: int
     opcode: Op
-    size: int = 0
-    stack: Optional[int] = None
-    operands: List[Union[str, bool, int, float, Operand, IFPSType, Function, None]] = field(default_factory=list)
-    operator: Optional[Union[AOp, COp]] = None
-    jumptarget: bool = False
+    size: int
+    stack: Optional[int]
+    operands: List[InstructionArgument]
+    operator: Optional[Union[AOp, COp]]
+    jumptarget: bool
+
+    def __init__(
+        self,
+        offset: int,
+        opcode: Op,
+        size: int = 0,
+        stack: Optional[int] = None,
+        operands: Optional[List[InstructionArgument]] = None,
+        operator: Optional[Union[AOp, COp]] = None,
+        jumptarget: bool = False,
+    ):
+        self.offset = offset
+        self.opcode = opcode
+        self.size = size
+        self.stack = stack
+        self.operands = [] if operands is None else operands
+        self.operator = operator
+        self.jumptarget = jumptarget
 
     def op(self, index: int):
         arg = self.operands[index]
@@ -908,83 +970,132 @@ class Instruction:
 
     @property
     def branches(self):
-        return self.opcode in (
-            Op.Jump,
-            Op.JumpFalse,
-            Op.JumpTrue,
-            Op.JumpFlag,
-            Op.JumpPop1,
-            Op.JumpPop2,
-        )
+        return self.opcode in _Op_Branches
 
     @property
     def jumps(self):
-        return self.opcode in (
-            Op.Jump,
-            Op.JumpPop1,
-            Op.JumpPop2,
-        )
+        return self.opcode in _Op_Jumps
 
     @property
     def stack_delta(self):
-        return _Op_StackD.get(self.opcode, 0)
+        return _Op_StackD[self.opcode]
 
     def oprep(self, labels: Optional[dict[int, str]] = None):
-        if self.branches:
-            dst = self.operands[0]
-            if not labels or not (label := labels.get(dst)):
-                label = F'0x{dst:X}'
-            var = [str(op) for op in self.operands[1:]]
-            return ', '.join((label, *var))
-        elif self.opcode is Op.PushEH:
-            ops = []
-            for op, name in reversed(list(zip(self.operands, NewEH))):
-                if op is None:
-                    continue
-                ops.append(F'{name}:0x{op:X}')
-            return '\x20'.join(ops)
-        elif self.opcode is Op.PopEH:
-            return F'End{EHType(self.operands[0])}'
-        elif self.opcode is Op.SetFlag:
-            rep, negated = self.operands
-            return F'!{rep}' if negated else str(rep)
-        elif self.opcode is Op.Compare:
-            dst, a, b = self.operands
-            return F'{dst!s} := {a!s} {self.operator!s} {b!s}'
-        elif self.opcode is Op.Calculate:
-            dst, src = self.operands
-            return F'{dst!s} {self.operator!s} {src!s}'
-        elif self.opcode in (Op.Assign, Op.SetPtr):
-            dst, src = self.operands
-            return F'{dst!s} := {src!s}'
-        else:
-            return ', '.join(str(op) for op in self.operands)
+        return _Op_OpRep[self.opcode](self, labels)
 
     def pretty(self, labels: Optional[dict[int, str]] = None):
-        return F'{self.opcode!s:<{_Op_Maxlen}}{_TAB}{self.oprep(labels)}'.strip()
+        return _Op_Pretty(self.opcode, self.oprep(labels)).strip()
 
     def __repr__(self):
-        return F'{self.opcode.name}({self.oprep()})'
+        return F'{self.opcode._name_}({self.oprep()})'
 
     def __str__(self):
         return self.pretty()
 
 
-@dataclass
+def _oprep_default(insn: Instruction, labels: Optional[dict[int, str]]):
+    return ', '.join(str(op) for op in insn.operands)
+
+
+def _oprep_branch(insn: Instruction, labels: Optional[dict[int, str]]):
+    dst = insn.operands[0]
+    if not labels or not (label := labels.get(dst)):
+        label = F'0x{dst:X}'
+    var = [str(op) for op in insn.operands[1:]]
+    return ', '.join((label, *var))
+
+
+def _oprep_push_eh(insn: Instruction, labels: Optional[dict[int, str]]):
+    ops = []
+    for op, name in reversed(list(zip(insn.operands, NewEH))):
+        if op is None:
+            continue
+        ops.append(F'{name}:0x{op:X}')
+    return '\x20'.join(ops)
+
+
+def _oprep_pop_eh(insn: Instruction, labels: Optional[dict[int, str]]):
+    return F'End{EHType(insn.operands[0])}'
+
+
+def _oprep_set_flag(insn: Instruction, labels: Optional[dict[int, str]]):
+    rep, negated = insn.operands
+    return F'!{rep}' if negated else str(rep)
+
+
+def _oprep_compare(insn: Instruction, labels: Optional[dict[int, str]]):
+    dst, a, b = insn.operands
+    return F'{dst!s} := {a!s} {insn.operator!s} {b!s}'
+
+
+def _oprep_calculate(insn: Instruction, labels: Optional[dict[int, str]]):
+    dst, src = insn.operands
+    return F'{dst!s} {insn.operator!s} {src!s}'
+
+
+def _oprep_assign(insn: Instruction, labels: Optional[dict[int, str]]):
+    dst, src = insn.operands
+    return F'{dst!s} := {src!s}'
+
+
+_Op_OpRep = [_oprep_default] * 0x100
+_Op_OpRep[Op.PushEH]    = _oprep_push_eh    # noqa
+_Op_OpRep[Op.PopEH]     = _oprep_pop_eh     # noqa
+_Op_OpRep[Op.SetFlag]   = _oprep_set_flag   # noqa
+_Op_OpRep[Op.Compare]   = _oprep_compare    # noqa
+_Op_OpRep[Op.Calculate] = _oprep_calculate  # noqa
+_Op_OpRep[Op.Assign]    = _oprep_assign     # noqa
+_Op_OpRep[Op.SetPtr]    = _oprep_assign     # noqa
+
+for _op in _Op_Branches:
+    _Op_OpRep[_op] = _oprep_branch
+
+del _op
+
+
 class BasicBlock:
+    __slots__ = (
+        'offset',
+        'stack',
+        'body',
+        'sources',
+        'targets',
+        '_stack_delta',
+        '_size',
+    )
     offset: int
-    stack: Optional[int] = None
-    body: List[Instruction] = field(default_factory=list)
-    sources: Dict[int, BasicBlock] = field(default_factory=dict)
-    targets: Dict[int, BasicBlock] = field(default_factory=dict)
+    stack: Optional[int]
+    body: List[Instruction]
+    sources: Dict[int, BasicBlock]
+    targets: Dict[int, BasicBlock]
+
+    def __init__(
+        self,
+        offset: int,
+        stack: Optional[int] = None,
+        body: Optional[List[Instruction]] = None,
+        sources: Optional[Dict[int, BasicBlock]] = None,
+        targets: Optional[Dict[int, BasicBlock]] = None,
+    ):
+        self.offset = offset
+        self.stack = stack
+        self.body = [] if body is None else body
+        self.sources = {} if sources is None else sources
+        self.targets = {} if targets is None else targets
+        self._stack_delta = None
+        self._size = None
 
     @property
-    def stack_delta(self):
-        return sum(insn.stack_delta for insn in self.body)
+    def stack_delta(self) -> int:
+        if (delta := self._stack_delta) is None:
+            self._stack_delta = delta = sum(insn.stack_delta for insn in self.body)
+        return delta
 
     @property
-    def size(self):
-        return sum(insn.size for insn in self.body)
+    def size(self) -> int:
+        if (size := self._size) is None:
+            self._size = size = sum(insn.size for insn in self.body)
+        return size
 
 
 class FTag(enum.IntFlag):
@@ -996,6 +1107,167 @@ class FTag(enum.IntFlag):
         return bool(self & v)
 
 
+_FTag_External = FTag.External.value
+_FTag_Exported = FTag.Exported.value
+_FTag_HasAttrs = FTag.HasAttrs.value
+
+
+def _integer_reader(spec: str, unwrap: bool = True) -> Callable[[IFPSReader, bool], Union[int, Tuple[int, ...]]]:
+    unpack = struct.Struct(spec).unpack_from
+    size = struct.calcsize(spec)
+
+    def read(self: IFPSReader, peek: bool = False) -> Union[int, Tuple[int, ...]]:
+        cursor = self._cursor
+        try:
+            value = unpack(self._data, cursor)
+        except struct.error as E:
+            raise EOFError from E
+        if not peek:
+            self._cursor = cursor + size
+        if unwrap:
+            value, = value
+        return value
+
+    return read
+
+
+class IFPSReader(StructReader[memoryview]):
+    """
+    A `refinery.lib.structures.StructReader` for IFPS files and bytecode. All reads in this format
+    are little endian and byte-aligned, which allows the integer reads to be implemented as a single
+    call to a precompiled struct instead of the generic bit-level integer parser. This includes the
+    length prefix of strings.
+    """
+    u8  = _integer_reader('<B')  # noqa
+    i8  = _integer_reader('<b')  # noqa
+    u16 = _integer_reader('<H')
+    i16 = _integer_reader('<h')
+    u32 = _integer_reader('<I')
+    i32 = _integer_reader('<i')
+    u64 = _integer_reader('<Q')
+    i64 = _integer_reader('<q')
+
+    u32x2 = _integer_reader('<2I', unwrap=False)
+    i32x4 = _integer_reader('<4i', unwrap=False)
+
+    def read_length_prefixed(self, prefix_size: int = 32, encoding: Optional[str] = None, block_size: int = 1):
+        if prefix_size == 32:
+            size = self.u32()
+        elif prefix_size == 8:
+            size = self.u8()
+        else:
+            size = self.read_integer(prefix_size)
+        data = self.read(size * block_size)
+        if encoding is not None:
+            data = codecs.decode(data, encoding)
+        return data
+
+
+_Decoder = Callable[['IFPSFile', IFPSReader, int, Op], Instruction]
+
+
+def _decode_nothing(ifps: IFPSFile, reader: IFPSReader, offset: int, opcode: Op):
+    return Instruction(offset, opcode)
+
+
+def _decode_operands_1(ifps: IFPSFile, reader: IFPSReader, offset: int, opcode: Op):
+    return Instruction(offset, opcode, operands=[ifps._read_operand(reader)])
+
+
+def _decode_operands_2(ifps: IFPSFile, reader: IFPSReader, offset: int, opcode: Op):
+    read = ifps._read_operand
+    return Instruction(offset, opcode, operands=[read(reader), read(reader)])
+
+
+def _decode_operands_3(ifps: IFPSFile, reader: IFPSReader, offset: int, opcode: Op):
+    read = ifps._read_operand
+    return Instruction(offset, opcode, operands=[read(reader), read(reader), read(reader)])
+
+
+def _decode_jump(ifps: IFPSFile, reader: IFPSReader, offset: int, opcode: Op):
+    target = reader.i32()
+    return Instruction(offset, opcode, operands=[reader.tell() + target])
+
+
+def _decode_conditional_jump(ifps: IFPSFile, reader: IFPSReader, offset: int, opcode: Op):
+    target = reader.i32()
+    value = ifps._read_operand(reader)
+    return Instruction(offset, opcode, operands=[reader.tell() + target, value])
+
+
+def _decode_call(ifps: IFPSFile, reader: IFPSReader, offset: int, opcode: Op):
+    insn = Instruction(offset, opcode, operands=[reader.u32()])
+    ifps._call_sites.append(insn)
+    return insn
+
+
+def _decode_calculate(ifps: IFPSFile, reader: IFPSReader, offset: int, opcode: Op):
+    operator = AOp(reader.u8())
+    read = ifps._read_operand
+    return Instruction(offset, opcode, operands=[read(reader), read(reader)], operator=operator)
+
+
+def _decode_compare(ifps: IFPSFile, reader: IFPSReader, offset: int, opcode: Op):
+    operator = COp(reader.u8())
+    read = ifps._read_operand
+    return Instruction(offset, opcode, operands=[read(reader), read(reader), read(reader)], operator=operator)
+
+
+def _decode_stack_type(ifps: IFPSFile, reader: IFPSReader, offset: int, opcode: Op):
+    variant, index = reader.u32x2()
+    return Instruction(offset, opcode, operands=[ifps._read_variant(variant), index])
+
+
+def _decode_push_type(ifps: IFPSFile, reader: IFPSReader, offset: int, opcode: Op):
+    return Instruction(offset, opcode, operands=[ifps.types[reader.u32()]])
+
+
+def _decode_set_flag(ifps: IFPSFile, reader: IFPSReader, offset: int, opcode: Op):
+    value = ifps._read_operand(reader)
+    return Instruction(offset, opcode, operands=[value, bool(reader.u8())])
+
+
+def _decode_push_eh(ifps: IFPSFile, reader: IFPSReader, offset: int, opcode: Op):
+    args = reader.i32x4()
+    position = reader.tell()
+    return Instruction(offset, opcode, operands=[a + position if a >= 0 else None for a in args])
+
+
+def _decode_pop_eh(ifps: IFPSFile, reader: IFPSReader, offset: int, opcode: Op):
+    return Instruction(offset, opcode, operands=[reader.u8()])
+
+
+_Op_Decoders: List[Optional[_Decoder]] = [None] * 0x100
+_Op_Decoders[Op.Assign]     = _decode_operands_2        # noqa
+_Op_Decoders[Op.Calculate]  = _decode_calculate         # noqa
+_Op_Decoders[Op.Push]       = _decode_operands_1        # noqa
+_Op_Decoders[Op.PushVar]    = _decode_operands_1        # noqa
+_Op_Decoders[Op.Pop]        = _decode_nothing           # noqa
+_Op_Decoders[Op.Call]       = _decode_call              # noqa
+_Op_Decoders[Op.Jump]       = _decode_jump              # noqa
+_Op_Decoders[Op.JumpTrue]   = _decode_conditional_jump  # noqa
+_Op_Decoders[Op.JumpFalse]  = _decode_conditional_jump  # noqa
+_Op_Decoders[Op.Ret]        = _decode_nothing           # noqa
+_Op_Decoders[Op.StackType]  = _decode_stack_type        # noqa
+_Op_Decoders[Op.PushType]   = _decode_push_type         # noqa
+_Op_Decoders[Op.Compare]    = _decode_compare           # noqa
+_Op_Decoders[Op.CallVar]    = _decode_operands_1        # noqa
+_Op_Decoders[Op.SetPtr]     = _decode_operands_2        # noqa
+_Op_Decoders[Op.BooleanNot] = _decode_operands_1        # noqa
+_Op_Decoders[Op.Neg]        = _decode_operands_1        # noqa
+_Op_Decoders[Op.SetFlag]    = _decode_set_flag          # noqa
+_Op_Decoders[Op.JumpFlag]   = _decode_jump              # noqa
+_Op_Decoders[Op.PushEH]     = _decode_push_eh           # noqa
+_Op_Decoders[Op.PopEH]      = _decode_pop_eh            # noqa
+_Op_Decoders[Op.IntegerNot] = _decode_operands_1        # noqa
+_Op_Decoders[Op.SetCopyPtr] = _decode_operands_2        # noqa
+_Op_Decoders[Op.Inc]        = _decode_operands_1        # noqa
+_Op_Decoders[Op.Dec]        = _decode_operands_1        # noqa
+_Op_Decoders[Op.JumpPop1]   = _decode_jump              # noqa
+_Op_Decoders[Op.JumpPop2]   = _decode_jump              # noqa
+_Op_Decoders[Op.Nop]        = _decode_nothing           # noqa
+
+
 class IFPSFile(Struct):
     MinVer = 12
     MaxVer = 23
@@ -1003,12 +1275,20 @@ class IFPSFile(Struct):
     Magic = B'IFPS'
 
     def __init__(self, reader: StructReader[memoryview], codec: str = 'latin1'):
+        if not isinstance(reader, IFPSReader):
+            outer = reader
+            reader = IFPSReader(outer.getbuffer())
+            reader.seekset(outer.tell())
+        else:
+            outer = None
         self.codec = codec
         self.types: List[IFPSType] = []
         self.functions: List[Function] = []
         self.globals: List[VariableBase] = []
         self.strings: List[str] = []
         self.reader = reader
+        self._known_strings: Set[str] = set()
+        self._call_sites: List[Instruction] = []
         if reader.remaining_bytes < 28:
             raise ValueError('Less than 28 bytes in file, not enough data to parse.')
         magic = reader.read(4)
@@ -1045,6 +1325,11 @@ class IFPSFile(Struct):
         self._load_variables()
 
         del self._known_type_names
+        del self._known_strings
+        del self._call_sites
+
+        if outer is not None:
+            outer.seekset(reader.tell())
 
     @property
     def _load_flags(self):
@@ -1108,7 +1393,7 @@ class IFPSFile(Struct):
                 members = tuple(types[reader.u32()] for _ in range(length))
                 t = TRecord(code, members, symbol=F'RECORD{k}')
             else:
-                t = TPrimitive(code, symbol=code.name)
+                t = TPrimitive(code, symbol=code._name_)
             if exported:
                 t.symbol = _normalize(reader.read_length_prefixed_ascii())
                 if self.version <= 21:
@@ -1117,39 +1402,35 @@ class IFPSFile(Struct):
             if self.version >= 21:
                 t.attributes = list(self._read_attributes())
 
-    def _read_value(self, reader: Optional[StructReader] = None) -> Value:
+    def _read_value(self, reader: Optional[IFPSReader] = None) -> Value:
         if reader is None:
             reader = self.reader
         type = self.types[reader.u32()]
-        size = type.code.width
-        processor: Optional[Callable[[], Union[int, float, str, bytes]]] = {
-            TC.U08           : reader.u8,
-            TC.S08           : reader.i8,
-            TC.U16           : reader.u16,
-            TC.S16           : reader.i16,
-            TC.U32           : reader.u32,
-            TC.S32           : reader.i32,
-            TC.S64           : reader.i64,
-            TC.Single        : reader.f32,
-            TC.Double        : reader.f64,
-            TC.Extended      : lambda: extended(reader.read(10)),
-            TC.AnsiString    : lambda: reader.read_length_prefixed(encoding=self.codec),
-            TC.PChar         : lambda: reader.read_length_prefixed(encoding=self.codec),
-            TC.WideString    : reader.read_length_prefixed_utf16,
-            TC.UnicodeString : reader.read_length_prefixed_utf16,
-            TC.Char          : lambda: chr(reader.u8()),
-            TC.WideChar      : lambda: chr(reader.u16()),
-            TC.ProcPtr       : lambda: self.functions[reader.u32() - 1],
-            TC.Set           : lambda: int.from_bytes(reader.read(type.size_in_bytes), 'little'),
-            TC.Currency      : lambda: reader.u64() / 10_000,
-        }.get(type.code, None)
-        if processor is not None:
-            data = processor()
-        elif size > 0:
+        code = type.code
+        if method := _TC_ReaderMethod[code]:
+            data = getattr(reader, method)()
+        elif code is TC.Extended:
+            data = extended(reader.read(10))
+        elif code is TC.AnsiString or code is TC.PChar:
+            data = reader.read_length_prefixed(encoding=self.codec)
+        elif code is TC.WideString or code is TC.UnicodeString:
+            data = reader.read_length_prefixed_utf16()
+        elif code is TC.Char:
+            data = chr(reader.u8())
+        elif code is TC.WideChar:
+            data = chr(reader.u16())
+        elif code is TC.ProcPtr:
+            data = self.functions[reader.u32() - 1]
+        elif code is TC.Set:
+            data = int.from_bytes(reader.read(type.size_in_bytes), 'little')
+        elif code is TC.Currency:
+            data = reader.u64() / 10_000
+        elif (size := code.width) > 0:
             data = bytes(reader.read(size))
         else:
             raise ValueError(F'Unable to read attribute of type {type!s}.')
-        if isinstance(data, str) and data not in self.strings:
+        if isinstance(data, str) and data not in self._known_strings:
+            self._known_strings.add(data)
             self.strings.append(data)
         return Value(type, data)
 
@@ -1170,6 +1451,7 @@ class IFPSFile(Struct):
             return signature
 
         reader = self.reader
+        view = memoryview(reader.getbuffer())
         width = len(F'{self.count_functions:X}')
         for k in range(self.count_functions):
             decl = None
@@ -1177,8 +1459,8 @@ class IFPSFile(Struct):
             name = F'F{k:0{width}X}'
             tags = reader.u8()
             attributes = None
-            exported = FTag.Exported.check(tags)
-            if FTag.External.check(tags):
+            exported = bool(tags & _FTag_Exported)
+            if tags & _FTag_External:
                 name = reader.read_length_prefixed_ascii(8)
                 if exported:
                     read = StructReader(bytes(reader.read_length_prefixed()))
@@ -1188,13 +1470,12 @@ class IFPSFile(Struct):
                 length = reader.u32()
                 if exported:
                     name = reader.read_length_prefixed_ascii()
-                    decl = DeclSpec.ParseE(bytes(reader.read_length_prefixed()), self)
+                    decl = DeclSpec.ParseE(reader.read_length_prefixed(), self)
                     self.void = decl.void
                 else:
                     self.void = False
-                with reader.detour(offset):
-                    body = list(self._parse_bytecode(reader.read(length)))
-            if FTag.HasAttrs.check(tags):
+                body = list(self._parse_bytecode(view[offset:offset + length]))
+            if tags & _FTag_HasAttrs:
                 attributes = list(self._read_attributes())
 
             if (signature := _signature(name, decl)) and decl and signature.argc == decl.argc:
@@ -1210,7 +1491,7 @@ class IFPSFile(Struct):
                     if (dr := decl.return_type) or (dr := self.types_by_name.get(sr)):
                         dr.symbol = sr
 
-            fn = Function(name, decl, body, exported, attributes)
+            fn = Function(name, decl, body, attributes=attributes)
             self.functions.append(fn)
 
         self.type_name_conflicts = self._name_types(True)
@@ -1233,13 +1514,10 @@ class IFPSFile(Struct):
                     decl.return_type = self.types_by_name.get(rt, decl.return_type)
                 function.decl = decl
 
-        for function in self.functions:
-            if function.body is None:
-                continue
-            for instruction in function.body:
-                if instruction.opcode is Op.Call:
-                    t: Function = self.functions[instruction.operands[0]]
-                    instruction.operands[0] = t
+        functions = self.functions
+        for instruction in self._call_sites:
+            operands = instruction.operands
+            operands[0] = functions[operands[0]]
 
     def _load_variables(self):
         reader = self.reader
@@ -1259,95 +1537,35 @@ class IFPSFile(Struct):
         index = -index if self.void else ~index
         return Variant(index, VariantType.Argument)
 
-    def _read_operand(self, reader: StructReader) -> Operand:
+    def _read_operand(self, reader: IFPSReader) -> Operand:
         ot = OperandType(reader.u8())
-        kw = {}
         if ot is OperandType.Variant:
-            kw.update(variant=self._read_variant(reader.u32()))
+            return Operand(ot, self._read_variant(reader.u32()))
         if ot is OperandType.Value:
-            kw.update(value=self._read_value(reader))
-        if ot >= OperandType.IndexedByInt:
-            kw.update(variant=self._read_variant(reader.u32()))
-            index = reader.u32()
-            if ot is OperandType.IndexedByVar:
-                index = self._read_variant(index)
-            kw.update(index=index)
-        return Operand(ot, **kw)
+            return Operand(ot, value=self._read_value(reader))
+        variant, index = reader.u32x2()
+        variant = self._read_variant(variant)
+        if ot is OperandType.IndexedByVar:
+            index = self._read_variant(index)
+        return Operand(ot, variant, index=index)
 
     def _parse_bytecode(self, data: memoryview) -> Generator[Instruction, None, None]:
-        disassembly: Dict[int, Instruction] = OrderedDict()
-        reader = StructReader(data)
-
-        argcount = {
-            Op.Assign: 2,
-            Op.CallVar: 1,
-            Op.Dec: 1,
-            Op.Inc: 1,
-            Op.BooleanNot: 1,
-            Op.Neg: 1,
-            Op.IntegerNot: 1,
-            Op.SetCopyPtr: 2,
-            Op.SetPtr: 2,
-        }
-
-        while not reader.eof:
-            def arg(k=1):
-                for _ in range(k):
-                    args.append(self._read_operand(reader))
-            addr = reader.tell()
-            cval = reader.u8()
-            code = Op.FromInt(cval)
-            insn = Instruction(addr, code)
-            args = insn.operands
-            disassembly[insn.offset] = insn
-            aryness = argcount.get(code)
-            if aryness is not None:
-                arg(aryness)
-            elif code in (Op.Ret, Op.Nop, Op.Pop):
-                pass
-            elif code is Op.Calculate:
-                insn.operator = AOp(reader.u8())
-                arg(2)
-            elif code in (Op.Push, Op.PushVar):
-                arg()
-            elif code in (Op.Jump, Op.JumpFlag):
-                target = reader.i32()
-                args.append(reader.tell() + target)
-            elif code is Op.Call:
-                args.append(reader.u32())
-            elif code in (Op.JumpTrue, Op.JumpFalse):
-                target = reader.i32()
-                val = self._read_operand(reader)
-                args.append(reader.tell() + target)
-                args.append(val)
-            elif code is Op.JumpPop1:
-                target = reader.i32()
-                args.append(reader.tell() + target)
-            elif code is Op.JumpPop2:
-                target = reader.i32()
-                args.append(reader.tell() + target)
-            elif code is Op.StackType:
-                args.append(self._read_variant(reader.u32()))
-                args.append(reader.u32())
-            elif code is Op.PushType:
-                args.append(self.types[reader.u32()])
-            elif code is Op.Compare:
-                insn.operator = COp(reader.u8())
-                arg(3)
-            elif code is Op.SetFlag:
-                arg()
-                args.append(bool(reader.u8()))
-            elif code is Op.PushEH:
-                args.extend(reader.i32() for _ in range(4))
-                for k, a in enumerate(args):
-                    args[k] = a + reader.tell() if a >= 0 else None
-            elif code is Op.PopEH:
-                args.append(reader.u8())
-            elif code is Op._INVALID:
+        disassembly: Dict[int, Instruction] = {}
+        reader = IFPSReader(data)
+
+        u8 = reader.u8
+        tell = reader.tell
+        end = len(data)
+        decoders = _Op_Decoders
+
+        while tell() < end:
+            addr = tell()
+            cval = u8()
+            if (decode := decoders[cval]) is None:
                 raise ValueError(F'Unsupported opcode: 0x{cval:02X}')
-            else:
-                raise ValueError(F'Unhandled opcode: {code.name}')
-            insn.size = reader.tell() - addr
+            insn = decode(self, reader, addr, _Op_ByInt[cval])
+            insn.size = tell() - addr
+            disassembly[addr] = insn
 
         for k, instruction in enumerate(disassembly.values()):
             if not instruction.branches:
@@ -1395,67 +1613,65 @@ class IFPSFile(Struct):
 
         external.sort(key=sortkey)
 
-        output = io.StringIO()
-        _omax = max((
-            max(insn.offset for insn in fn.body)
-            for fn in self.functions if fn.body
-        ), default=0)
-        _smax = max((
-            max(insn.stack for insn in fn.body if insn.stack is not None)
-            for fn in self.functions if fn.body
-        ), default=0)
+        output: list[str] = []
+        write = output.append
+        _omax = _smax = 0
+        for function in self.functions:
+            if body := function.body:
+                _omax = max(_omax, body[-1].offset)
+                _smax = max(_smax, function.max_stack)
         _omax = max(len(self.types), len(self.globals), _omax)
         _omax = len(F'{_omax:X}')
         _smax = len(F'{_smax:d}')
+        unknown = '?' * _smax
+        line = F'{_TAB}0x{{:0{_omax}X}}{_TAB}{{:>{_smax}}}{_TAB}{{}}\n'.format
 
         if classes:
             for name, members in classes.items():
                 if not members:
-                    output.write(F'external class {name};\n')
-            output.write('\n')
+                    write(F'external class {name};\n')
+            write('\n')
             for name, members in classes.items():
                 if not members:
                     continue
-                output.write(F'external class {name}')
+                write(F'external class {name}')
                 if members:
                     for spec in members.values():
-                        output.write(F'\n{_TAB}{spec.decl.represent(spec.symbol, rel=True)}')
-                    output.write('\nend')
-                output.write(';\n\n')
+                        write(F'\n{_TAB}{spec.decl.represent(spec.symbol, rel=True)}')
+                    write('\nend')
+                write(';\n\n')
 
         if self.types:
             for type in self.types:
-                if type.code != TC.Record and type.symbol in (type.code.name, None):
+                if type.code != TC.Record and type.symbol in (type.code._name_, None):
                     continue
                 if isinstance(type, TClass):
                     continue
-                output.write(F'typedef {type.symbol} = {type.display()}\n')
-            output.write('\n')
+                write(F'typedef {type.symbol} = {type.display()}\n')
+            write('\n')
 
         if self.globals:
             for variable in self.globals:
-                output.write(F'global {variable!s}\n')
-            output.write('\n')
+                write(F'global {variable!s}\n')
+            write('\n')
 
         if external:
             for function in external:
-                output.write(F'external {function!r}\n')
-            output.write('\n')
+                write(F'external {function!r}\n')
+            write('\n')
 
         if internal:
             for function in internal:
-                output.write(F'{function!r}\nbegin\n')
-                labels = [insn.offset for insn in function.body if insn.jumptarget]
+                write(F'{function!r}\nbegin\n')
+                labels = function.labels
                 labelw = max(len(str(len(labels))), 2)
                 labeld = {v: F'JumpDestination{k:0{labelw}d}' for k, v in enumerate(labels, 1)}
-                labelc = 0
                 for instruction in function.body:
-                    stack = instruction.stack
-                    stack = '?' * _smax if stack is None else F'{stack:>{_smax}d}'
+                    if (stack := instruction.stack) is None:
+                        stack = unknown
                     if instruction.jumptarget:
-                        output.write(F'{labeld[labels[labelc]]}:\n')
-                        labelc += 1
-                    output.write(F'{_TAB}0x{instruction.offset:0{_omax}X}{_TAB}{stack}{_TAB}{instruction.pretty(labeld)}\n')
-                output.write('end;\n\n')
+                        write(F'{labeld[instruction.offset]}:\n')
+                    write(line(instruction.offset, stack, instruction.pretty(labeld)))
+                write('end;\n\n')
 
-        return output.getvalue().strip()
+        return ''.join(output).strip()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import math
+import struct
+
+from refinery.lib.inno.ifps import extended, DeclSpec, IFPSFile, IFPSReader
+from refinery.lib.structures import StructReader
+from .. import TestBase
+
+
+class TestIFPS(TestBase):
+
+    def test_extended_float_values(self):
+        for value in (1.0, -3.25, 0.1, 1e300, -2.5e-310, 123456.789):
+            mantissa, exponent = math.frexp(abs(value))
+            exponent = exponent + 16382
+            if value < 0:
+                exponent |= 0x8000
+            data = struct.pack('<QH', int(mantissa * (1 << 64)), exponent)
+            self.assertEqual(extended(data), value)
+
+    def test_extended_special_values(self):
+        self.assertEqual(extended(struct.pack('<QH', 0, 0x8000)), 0)
+        self.assertEqual(extended(struct.pack('<QH', 1 << 63, 0x7FFF)), float('Inf'))
+        self.assertEqual(extended(struct.pack('<QH', 1 << 63, 0xFFFF)), -float('Inf'))
+        self.assertEqual(extended(struct.pack('<QH', 1 << 63, 0x7FFE)), float('Inf'))
+        self.assertTrue(math.isnan(extended(struct.pack('<QH', 3 << 62, 0x7FFF))))
+
+    def test_reader_matches_struct_reader(self):
+        data = bytes(range(0x80, 0xFF))
+        methods = ('u8', 'i8', 'u16', 'i16', 'u32', 'i32', 'u64', 'i64')
+        fast = IFPSReader(memoryview(data))
+        slow = StructReader(memoryview(data))
+        for method in methods:
+            self.assertEqual(getattr(fast, method)(peek=True), getattr(slow, method)(peek=True))
+            self.assertEqual(getattr(fast, method)(), getattr(slow, method)())
+            self.assertEqual(fast.tell(), slow.tell())
+        fast.seekset(-3)
+        with self.assertRaises(EOFError):
+            fast.u32()
+        self.assertEqual(fast.u16(), 0xFDFC)
+
+    def test_reader_tuples(self):
+        data = struct.pack('<4i', -1, 2, -3, 4)
+        reader = IFPSReader(memoryview(data))
+        self.assertEqual(reader.u32x2(peek=True), (0xFFFFFFFF, 2))
+        self.assertEqual(reader.i32x4(), (-1, 2, -3, 4))
+        self.assertTrue(reader.eof)
+        with self.assertRaises(EOFError):
+            reader.u32x2()
+
+    def test_reader_length_prefixed(self):
+        data = b'\x03abc\x01\x00\x00\x00\xE4\x00'
+        reader = IFPSReader(memoryview(data))
+        self.assertEqual(reader.read_length_prefixed_ascii(8), 'abc')
+        self.assertEqual(reader.read_length_prefixed_utf16(), '\xE4')
+        self.assertTrue(reader.eof)
+
+    def test_function_with_attributes(self):
+        def u32(x):
+            return struct.pack('<I', x)
+
+        def lp(b):
+            return u32(len(b)) + b
+
+        header = B'IFPS' + u32(23) + u32(1) + u32(1) + u32(0) + u32(0) + u32(0)
+        types = B'\x05' + u32(0)
+        attributes = u32(1) + lp(B'Attr') + u32(1) + u32(0) + u32(7)
+
+        def function(offset):
+            return B'\x06' + u32(offset) + u32(1) + lp(B'MAIN') + lp(B'-1')
+
+        offset = len(header + types + function(0) + attributes)
+        ifps = IFPSFile(header + types + function(offset) + attributes + B'\x09')
+        main, = ifps.functions
+        self.assertEqual(len(main.attributes), 1)
+        self.assertEqual(main.attributes[0].name, 'Attr')
+        self.assertIn('begin', ifps.disassembly())
+        self.assertEqual(main.labels, [])
+
+    def test_declaration_with_non_ascii_digit(self):
+        ifps = IFPSFile(struct.pack('<4s6I', B'IFPS', 23, 0, 0, 0, 0, 0))
+        decl = DeclSpec.ParseE(B'-1 @\xB2 !\xB9', ifps)
+        self.assertTrue(decl.void)
+        self.assertEqual([p.type for p in decl.parameters], [None, None])
+        self.assertEqual([p.const for p in decl.parameters], [True, False])
+
+    def test_accepts_struct_reader(self):
+        data = struct.pack('<4s6I', B'IFPS', 23, 0, 0, 0, 0, 0)
+        reader = StructReader(data)
+        ifps = IFPSFile(reader)
+        self.assertIsInstance(ifps.reader, IFPSReader)
+        self.assertEqual(reader.tell(), len(data))